@@ -1,223 +1,375 @@
-import json
 import pymupdf
-import pprint
-import time
 import os
-from collections import Counter
+import math
+import logging
+from collections import defaultdict
 import re
-import pprint
+import sys
+import numpy as np
 
-def calculate_weighted_mean_font_size(blocks: list[dict]) -> float:
-    """Calculates the character-weighted average font size for a list of blocks."""
-    if not blocks:
-        return 0.0
+logger = logging.getLogger(__name__)
+
+# Precompiled patterns used on every block/line
+_WS_RE = re.compile(r'\s+')
+_TRIM_RE = re.compile(r'^\W+|\W+$')
+_LIST_RE = re.compile(r'^\s*([•\-]|\d+\.)\s+')
+_ALPHA_RE = re.compile('[a-zA-Z]')
+
+# Canonical instances of (size, font, is_bold, color) style tuples, so that equal
+# styles are the same object and compare/hash via the identity fast path.
+_STYLE_INTERN = {}
 
-    total_char_length = sum(len(block['text']) for block in blocks)
+def _intern(style: tuple) -> tuple:
+    return _STYLE_INTERN.setdefault(style, style)
+
+# Bold-ness per (font name, span flags); font names repeat heavily within a document
+_BOLD_CACHE = {}
+
+class BlockTable:
+    """
+    Column-oriented (structure-of-arrays) store for text blocks: one NumPy array
+    per field, so each filter only touches the columns it needs.
+    Indexing with a boolean mask or index array returns a new, filtered table.
+    """
+    COLUMNS = ("page_number", "page_height", "text", "bbox", "font_size", "font_name", "is_bold", "color")
+
+    def __init__(self, page_number, page_height, text, bbox, font_size, font_name, is_bold, color):
+        self.page_number = np.asarray(page_number, dtype=np.int32)
+        self.page_height = np.asarray(page_height, dtype=np.float32)
+        self.text = np.asarray(text, dtype=object)
+        self.bbox = np.asarray(bbox, dtype=np.float32).reshape(-1, 4)
+        self.font_size = np.asarray(font_size, dtype=np.int16)
+        self.font_name = np.asarray(font_name, dtype=object)
+        self.is_bold = np.asarray(is_bold, dtype=bool)
+        self.color = np.asarray(color, dtype=np.int32)
+
+    @classmethod
+    def empty(cls) -> "BlockTable":
+        return cls([], [], [], [], [], [], [], [])
+
+    def __len__(self) -> int:
+        return len(self.text)
+
+    def __getitem__(self, index) -> "BlockTable":
+        return BlockTable(*(getattr(self, col)[index] for col in self.COLUMNS))
+
+    def to_records(self) -> list[dict]:
+        """Converts the table to the plain list-of-dicts block representation."""
+        columns = [getattr(self, col).tolist() for col in self.COLUMNS]
+        records = [dict(zip(self.COLUMNS, row)) for row in zip(*columns)]
+        for record in records:
+            record["bbox"] = tuple(record["bbox"])
+        return records
+
+def _word_counts(texts: np.ndarray) -> np.ndarray:
+    return np.fromiter((len(text.split()) for text in texts), dtype=np.int32, count=len(texts))
+
+def _char_lengths(texts: np.ndarray) -> np.ndarray:
+    return np.fromiter((len(text) for text in texts), dtype=np.int64, count=len(texts))
+
+def _weighted_mean_font_size(font_sizes: np.ndarray, char_lengths: np.ndarray) -> float:
+    total_char_length = char_lengths.sum()
     if total_char_length == 0:
         return 0.0
+    return float(np.dot(font_sizes, char_lengths) / total_char_length)
+
+def calculate_weighted_mean_font_size(table: BlockTable) -> float:
+    """Calculates the character-weighted average font size for a table of blocks."""
+    if not len(table):
+        return 0.0
+    return _weighted_mean_font_size(table.font_size, _char_lengths(table.text))
 
-    weighted_font_sum = sum(block['font_size'] * len(block['text']) for block in blocks)
-    return weighted_font_sum / total_char_length
+def _long_block_mask(table: BlockTable, weighted_avg_font_size: float, max_words: int) -> np.ndarray:
+    # Keep the block if it's not long, OR if it's long but has a very large font.
+    return (_word_counts(table.text) <= max_words) | (table.font_size > weighted_avg_font_size * 1.5)
 
-def filter_long_blocks(blocks: list[dict], weighted_avg_font_size: float, max_words: int = 20) -> list[dict]:
+def filter_long_blocks(table: BlockTable, weighted_avg_font_size: float, max_words: int = 20) -> BlockTable:
     """
     Filters out text blocks that exceed a specified word count, unless they
     are significantly larger than the average font size (likely a title).
     """
-    if not blocks:
-        return []
-        
-    final_blocks = []
-    for block in blocks:
-        is_long = len(block['text'].split()) > max_words
-        is_large_font = block['font_size'] > (weighted_avg_font_size * 1.5)
-
-        # Keep the block if it's not long, OR if it's long but has a very large font.
-        if not is_long or is_large_font:
-            final_blocks.append(block)
-            
-    return final_blocks
-
-def filter_small_fonts_by_weighted_mean(blocks: list[dict], weighted_avg_font_size: float) -> list[dict]:
+    if not len(table):
+        return table
+    return table[_long_block_mask(table, weighted_avg_font_size, max_words)]
+
+def _majority_color(colors: np.ndarray) -> int:
+    # Sort-based histogram: cost scales with the block count, not the largest color value
+    values, counts = np.unique(colors, return_counts=True)
+    return int(values[counts.argmax()])
+
+def _small_font_mask(table: BlockTable, weighted_avg_font_size: float, majority_color: int) -> np.ndarray:
+    # Keep blocks if they are larger than the average, OR if they are bold,
+    # OR if their color is not the majority color.
+    return (table.font_size > weighted_avg_font_size) | table.is_bold | (table.color != majority_color)
+
+def filter_small_fonts_by_weighted_mean(table: BlockTable, weighted_avg_font_size: float) -> BlockTable:
     """
     Filters out blocks with font sizes at or below a character-weighted average,
     unless the block has other heading-like features like boldness or a unique color.
     """
-    if not blocks:
-        return []
+    if not len(table):
+        return table
 
     # Find the majority color in the document
-    colors = [block['color'] for block in blocks]
-    majority_color = Counter(colors).most_common(1)[0][0] if colors else 0
-    print(f"Found majority text color: {majority_color}")
+    majority_color = _majority_color(table.color)
+    logger.debug("Found majority text color: %s", majority_color)
     
-    # --- Reverted to single-pass logic ---
-    # Keep blocks if they are larger than the average, OR if they are bold,
-    # OR if their color is not the majority color.
-    final_blocks = [
-        block for block in blocks 
-        if block['font_size'] > weighted_avg_font_size or 
-           block['is_bold'] or 
-           block['color'] != majority_color
-    ]
+    return table[_small_font_mask(table, weighted_avg_font_size, majority_color)]
 
-    return final_blocks
-
-def find_repeating_texts(blocks: list[dict], page_count: int, min_occurrence_ratio: float = 0.5) -> set:
+def find_repeating_texts(table: BlockTable, page_count: int, min_occurrence_ratio: float = 0.5) -> set:
     """
     Finds text content that repeats across a significant number of pages.
     """
-    if not blocks or page_count == 0:
+    if not len(table) or page_count == 0:
         return set()
 
-    text_page_map = {}
-    for block in blocks:
-        text = block['text']
-        page = block['page_number']
-        if text not in text_page_map:
-            text_page_map[text] = set()
+    text_page_map = defaultdict(set)
+    for text, page in zip(table.text, table.page_number.tolist()):
         text_page_map[text].add(page)
     
-    min_pages = int(page_count * min_occurrence_ratio)
-    if min_pages < 2: min_pages = 2
+    min_pages = max(2, int(page_count * min_occurrence_ratio))
+    return {text for text, pages in text_page_map.items() if len(pages) >= min_pages}
 
-    repeating_texts = {text for text, pages in text_page_map.items() if len(pages) >= min_pages}
-    
-    return repeating_texts
+def _header_footer_mask(table: BlockTable, page_count: int, header_margin: float, footer_margin: float) -> np.ndarray:
+    # True for blocks to keep, i.e. not repeating text inside a page margin
+    repeating_texts = frozenset(find_repeating_texts(table, page_count))
+    if not repeating_texts:
+        return np.ones(len(table), dtype=bool)
+
+    # Thresholds follow each block's own page height (A4, Letter, landscape...)
+    header_threshold = table.page_height * header_margin
+    footer_threshold = table.page_height * (1 - footer_margin)
+
+    is_repeating = np.isin(table.text, np.array(list(repeating_texts), dtype=object))
+    is_in_margin = (table.bbox[:, 1] < header_threshold) | (table.bbox[:, 3] > footer_threshold)
+    return ~(is_repeating & is_in_margin)
 
-def filter_header_footer_blocks(blocks: list[dict], page_count: int, header_margin: float = 0.12, footer_margin: float = 0.12) -> list[dict]:
+def filter_header_footer_blocks(table: BlockTable, page_count: int, header_margin: float = 0.12, footer_margin: float = 0.12) -> BlockTable:
     """
     Filters out blocks that are likely headers or footers based on repetition and position.
     """
-    if not blocks:
-        return []
+    if not len(table):
+        return table
+    return table[_header_footer_mask(table, page_count, header_margin, footer_margin)]
+
+def _clean_text(text: str) -> str | None:
+    text = _WS_RE.sub(' ', text.strip())
+    text = _TRIM_RE.sub('', text)
+    # Only keep the block if it contains at least one alphabetic character
+    return text if text and _ALPHA_RE.search(text) else None
+
+def _select_cleaned(table: BlockTable, indices) -> BlockTable:
+    kept, cleaned_texts = [], []
+    for i in indices:
+        text = _clean_text(table.text[i])
+        if text is not None:
+            kept.append(i)
+            cleaned_texts.append(text)
+    processed = table[np.asarray(kept, dtype=np.intp)]
+    processed.text = np.asarray(cleaned_texts, dtype=object)
+    return processed
+
+def post_process_blocks(table: BlockTable) -> BlockTable:
+    """
+    Cleans and finalizes the text content of each logical block.
+    """
+    return _select_cleaned(table, range(len(table)))
 
-    repeating_texts = find_repeating_texts(blocks, page_count)
-    if not repeating_texts:
-        return blocks
+def apply_all_filters(table: BlockTable, page_count: int, max_words: int = 20) -> BlockTable:
+    """
+    Fused equivalent of header/footer -> long block -> small font filtering followed
+    by post-processing. Each stage only narrows a keep-mask (its statistics are taken
+    over the blocks that survived the earlier stages), and the table is materialized once.
+    """
+    if not len(table):
+        return table
 
-    page_height = 792 
-    header_threshold = page_height * header_margin
-    footer_threshold = page_height * (1 - footer_margin)
+    keep = _header_footer_mask(table, page_count, 0.12, 0.12)
+    weighted_avg_font_size = _weighted_mean_font_size(table.font_size[keep], _char_lengths(table.text[keep]))
 
-    filtered_blocks = []
-    for block in blocks:
-        is_repeating = block['text'] in repeating_texts
-        is_in_header = block['bbox'][1] < header_threshold
-        is_in_footer = block['bbox'][3] > footer_threshold
+    keep &= _long_block_mask(table, weighted_avg_font_size, max_words)
+    if not keep.any():
+        return table[keep]
 
-        if not (is_repeating and (is_in_header or is_in_footer)):
-            filtered_blocks.append(block)
-            
-    return filtered_blocks
+    majority_color = _majority_color(table.color[keep])
+    keep &= _small_font_mask(table, weighted_avg_font_size, majority_color)
 
-def post_process_blocks(blocks: list[dict]) -> list[dict]:
+    return _select_cleaned(table, np.flatnonzero(keep))
+
+def _is_bold_font(font_name: str) -> bool:
+    font_name_lower = font_name.lower()
+    return "bold" in font_name_lower or "heavy" in font_name_lower
+
+def _is_uniform_body_page(page, body_line_height: float, tolerance: float = 1.0, sample_words: int = 200) -> bool:
     """
-    Cleans and finalizes the text content of each logical block.
+    Cheap check for pages that hold nothing but body text: every sampled word has
+    the body line height (within tolerance) and the page uses no bold fonts.
+    Relies on the "words" and font-list extractions, which are far cheaper than "dict".
     """
-    processed_blocks = []
-    for block in blocks:
-        text = block["text"].strip()
-        text = re.sub(r'\s+', ' ', text)
-        text = re.sub(r'^\W+|\W+$', '', text)
-        
-        # --- New: Only keep the block if it contains at least one alphabetic character ---
-        if text and re.search('[a-zA-Z]', text):
-            block["text"] = text
-            processed_blocks.append(block)
-            
-    return processed_blocks
-
-def extract_logical_text_blocks(pdf_path: str, line_proximity_threshold: float = 4.0) -> tuple[list[dict], int]:
+    words = page.get_text("words")[:sample_words]
+    if not words:
+        return False
+    heights = np.array([word[3] - word[1] for word in words])
+    median_height = np.median(heights)
+    if abs(median_height - body_line_height) > tolerance or np.any(np.abs(heights - median_height) > tolerance):
+        return False
+    # get_fonts() entries are (xref, ext, type, basefont, name, encoding, referencer)
+    return not any(_is_bold_font(font[3]) for font in page.get_fonts())
+
+def _extract_body_page_blocks(page, flags: int, body_style: tuple) -> list[dict]:
+    """Emits a uniform body page's blocks straight from the cheap "blocks" extraction."""
+    merged_blocks = []
+    for x0, y0, x1, y1, text, _, block_type in page.get_text("blocks", flags=flags):
+        text = " ".join(text.splitlines())
+        if block_type == 0 and text.strip():
+            merged_blocks.append({"text": text, "bbox": (x0, y0, x1, y1), "style": body_style})
+    return merged_blocks
+
+def _extract_page_blocks(page, flags: int, line_proximity_threshold: float, style_stats: dict | None = None) -> list[dict]:
+    """
+    Full "dict" extraction for one page: builds styled lines and merges them into blocks.
+    If given, accumulates per-style [char count, line height sum, line count] into style_stats.
+    """
+    page_dict = page.get_text("dict", flags=flags)
+    
+    spans = page_dict["blocks"]
+    lines = []
+    for block in spans:
+        if block.get("type") == 0 and "lines" in block:
+            for line in block["lines"]:
+                line_text, styles = "", {}
+                x0, y0, x1, y1 = math.inf, math.inf, -math.inf, -math.inf
+                for span in line["spans"]:
+                    bold_key = (span.get("font", ""), span.get("flags", 0))
+                    is_bold = _BOLD_CACHE.get(bold_key)
+                    if is_bold is None:
+                        is_bold = bool(bold_key[1] & 2**4) or _is_bold_font(bold_key[0])
+                        _BOLD_CACHE[bold_key] = is_bold
+                    
+                    # Add color to the style tuple
+                    color = span.get("color", 0)
+                    span_style = _intern((round(span["size"]), sys.intern(span["font"]), is_bold, color))
+                    
+                    span_text = span["text"]
+                    styles[span_style] = styles.get(span_style, 0) + len(span_text)
+                    line_text += span_text
+
+                    # Union the span bbox with plain float compares (no Rect objects)
+                    bx0, by0, bx1, by1 = span["bbox"]
+                    x0 = bx0 if bx0 < x0 else x0
+                    y0 = by0 if by0 < y0 else y0
+                    x1 = bx1 if bx1 > x1 else x1
+                    y1 = by1 if by1 > y1 else y1
+                if line_text.strip():
+                    if not styles: continue
+                    dominant_style = max(styles.items(), key=lambda kv: kv[1])[0]
+                    lines.append({"text": line_text, "bbox": (x0, y0, x1, y1), "style": dominant_style})
+
+                    if style_stats is not None:
+                        stats = style_stats.get(dominant_style)
+                        if stats is None:
+                            stats = style_stats[dominant_style] = [0, 0.0, 0]
+                        stats[0] += len(line_text)
+                        stats[1] += y1 - y0
+                        stats[2] += 1
+    
+    merged_blocks = []
+    if lines:
+        current_block = {"text": lines[0]["text"], "bbox": lines[0]["bbox"], "style": lines[0]["style"]}
+        for i in range(1, len(lines)):
+            prev_line, current_line = lines[i-1], lines[i]
+            same_style = (current_line["style"] is prev_line["style"]) # Styles are interned
+            vertically_close = (current_line["bbox"][1] - prev_line["bbox"][3]) < line_proximity_threshold
+            is_list_item = _LIST_RE.match(current_line['text'])
+            if same_style and vertically_close and not is_list_item:
+                a, b = current_block["bbox"], current_line["bbox"]
+                current_block["text"] += " " + current_line["text"]
+                current_block["bbox"] = (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+            else:
+                merged_blocks.append(current_block)
+                current_block = {"text": current_line["text"], "bbox": current_line["bbox"], "style": current_line["style"]}
+        merged_blocks.append(current_block)
+    return merged_blocks
+
+STORE_SHRINK_INTERVAL = 100 # Pages between releases of MuPDF's object cache
+
+def extract_logical_text_blocks(pdf_path: str, line_proximity_threshold: float = 4.0, fast_body_pages: bool = False) -> tuple[BlockTable, int]:
     """
     Extracts logically coherent text blocks by merging lines based on style and proximity.
+    With fast_body_pages, pages that look like plain body text in the document's
+    dominant style (learned from pages already parsed) skip the costly "dict" pass.
+    This is off by default because those pages are approximated: list items are not
+    split, every block gets the body style (colour included), and bold detection only
+    sees font names, so the classifier input differs from the full extraction.
     """
     try:
-        doc = pymupdf.open(pdf_path)
+        doc = pymupdf.open(pdf_path, filetype="pdf")
     except Exception as e:
         print(f"Error opening PDF file: {e}")
-        return [], 0
+        return BlockTable.empty(), 0
 
-    final_blocks = []
+    # Columns are collected in typed lists and converted to arrays once at the end
+    columns = {col: [] for col in BlockTable.COLUMNS}
+    # Style statistics only feed the body-page shortcut
+    style_stats = {} if fast_body_pages else None
     page_count = doc.page_count
-    for page_num, page in enumerate(doc):
-        flags = pymupdf.TEXT_PRESERVE_LIGATURES | pymupdf.TEXT_DEHYPHENATE
-        page_dict = page.get_text("dict", flags=flags)
-        
-        spans = page_dict["blocks"]
-        lines = []
-        for block in spans:
-            if block.get("type") == 0 and "lines" in block:
-                for line in block["lines"]:
-                    line_text, style_counter, line_bbox = "", Counter(), pymupdf.Rect()
-                    for span in line["spans"]:
-                        font_name_lower = span.get("font", "").lower()
-                        is_bold_by_flag = (span.get("flags", 0) & 2**4) > 0
-                        is_bold_by_name = "bold" in font_name_lower or "heavy" in font_name_lower
-                        is_bold = is_bold_by_flag or is_bold_by_name
-                        
-                        # Add color to the style tuple
-                        color = span.get("color", 0)
-                        span_style = (round(span["size"]), span["font"], is_bold, color)
-                        
-                        span_text = span["text"]
-                        style_counter[span_style] += len(span_text)
-                        line_text += span_text
-                        line_bbox.include_rect(span["bbox"])
-                    if line_text.strip():
-                        if not style_counter: continue
-                        dominant_style = style_counter.most_common(1)[0][0]
-                        lines.append({"text": line_text, "bbox": line_bbox, "style": dominant_style})
-        
-        if not lines: continue
-
-        merged_blocks = []
-        if lines:
-            current_block = {"text": lines[0]["text"], "bbox": pymupdf.Rect(lines[0]["bbox"]), "style": lines[0]["style"]}
-            for i in range(1, len(lines)):
-                prev_line, current_line = lines[i-1], lines[i]
-                same_style = (current_line["style"] == prev_line["style"])
-                vertically_close = (current_line["bbox"].y0 - prev_line["bbox"].y1) < line_proximity_threshold
-                is_list_item = re.match(r'^\s*([•-]|(\d+\.))\s+', current_line['text'])
-                if same_style and vertically_close and not is_list_item:
-                    current_block["text"] += " " + current_line["text"]
-                    current_block["bbox"].include_rect(current_line["bbox"])
-                else:
-                    merged_blocks.append(current_block)
-                    current_block = {"text": current_line["text"], "bbox": pymupdf.Rect(current_line["bbox"]), "style": current_line["style"]}
-            merged_blocks.append(current_block)
+    # Clip extraction to the mediabox so text outside the visible page is ignored
+    flags = pymupdf.TEXT_PRESERVE_LIGATURES | pymupdf.TEXT_DEHYPHENATE | pymupdf.TEXT_MEDIABOX_CLIP
+    # Pages are loaded one at a time and dropped right after use, so page
+    # objects don't accumulate for the lifetime of the document.
+    for page_num in range(page_count):
+        page = doc.load_page(page_num)
+        page_height = page.rect.height
+
+        merged_blocks = None
+        if fast_body_pages and style_stats:
+            body_style, (_, height_sum, line_count) = max(style_stats.items(), key=lambda kv: kv[1][0])
+            if _is_uniform_body_page(page, height_sum / line_count):
+                merged_blocks = _extract_body_page_blocks(page, flags, body_style)
+        if merged_blocks is None:
+            merged_blocks = _extract_page_blocks(page, flags, line_proximity_threshold, style_stats)
+        del page
+        if (page_num + 1) % STORE_SHRINK_INTERVAL == 0:
+            pymupdf.TOOLS.store_shrink(100) # Empty MuPDF's resource store to cap peak RSS
         
         for block in merged_blocks:
-            final_blocks.append({
-                "page_number": page_num + 1,
-                "text": block["text"],
-                "bbox": tuple(block["bbox"]),
-                "font_size": block["style"][0],
-                "font_name": block["style"][1],
-                "is_bold": block["style"][2],
-                "color": block["style"][3]
-            })
+            font_size, font_name, is_bold, color = block["style"]
+            columns["page_number"].append(page_num + 1)
+            columns["page_height"].append(page_height)
+            columns["text"].append(block["text"])
+            columns["bbox"].append(block["bbox"])
+            columns["font_size"].append(font_size)
+            columns["font_name"].append(font_name)
+            columns["is_bold"].append(is_bold)
+            columns["color"].append(color)
 
     doc.close()
-    return final_blocks, page_count
-
-def engineer_layout_features(blocks: list[dict]) -> list[dict]:
-    """This function remains the same and works with the new block structure."""
-    if not blocks: return []
-    font_sizes = [block['font_size'] for block in blocks if block['font_size'] > 0]
-    if not font_sizes: return []
-    modal_font_size = Counter(font_sizes).most_common(1)[0][0]
-    for block in blocks:
-        block['relative_font_size'] = block['font_size'] / modal_font_size if modal_font_size > 0 else 0
-        block['is_bold_numeric'] = 1 if block['is_bold'] else 0
-        block['char_count'] = len(block['text'])
-        block['word_count'] = len(block['text'].split())
-        page_height = 792 
-        block['vertical_position'] = block['bbox'][1] / page_height if page_height > 0 else 0
-    return blocks
+    return BlockTable(**columns), page_count
+
+def engineer_layout_features(table: BlockTable) -> dict[str, np.ndarray]:
+    """Computes the numerical layout features for every block as NumPy columns."""
+    if not len(table):
+        return {name: np.zeros(0) for name in ("relative_font_size", "is_bold_numeric", "char_count", "word_count", "vertical_position")}
+
+    sizes, counts = np.unique(table.font_size[table.font_size > 0], return_counts=True)
+    modal_font_size = sizes[counts.argmax()] if len(sizes) else 0
+    relative_font_size = table.font_size / modal_font_size if modal_font_size > 0 else np.zeros(len(table))
+    vertical_position = np.divide(table.bbox[:, 1], table.page_height, out=np.zeros(len(table), dtype=np.float32), where=table.page_height > 0)
+    return {
+        "relative_font_size": relative_font_size,
+        "is_bold_numeric": table.is_bold.astype(np.int8),
+        "char_count": _char_lengths(table.text),
+        "word_count": _word_counts(table.text),
+        "vertical_position": vertical_position,
+    }
 
 # --- Verification Step ---
 if __name__ == "__main__":
+    import json
+    import time
+
+    logging.basicConfig(level=logging.DEBUG if os.environ.get("DEBUG") else logging.INFO)
+
     sample_dir = "sample_dataset/input"
     sample_pdf_path = os.path.join(sample_dir, "file02.pdf")
     
@@ -242,24 +394,14 @@ if __name__ == "__main__":
     extracted_blocks, page_count = extract_logical_text_blocks(sample_pdf_path)
     print(f"1. Extraction complete. Found {len(extracted_blocks)} logical blocks.")
     
-    non_header_footer_blocks = filter_header_footer_blocks(extracted_blocks, page_count)
-    print(f"2. Header/Footer filtering complete. {len(non_header_footer_blocks)} blocks remaining.")
-
-    # --- New Order: Calculate font size threshold before other filters ---
-    weighted_font_threshold = calculate_weighted_mean_font_size(non_header_footer_blocks)
-    print(f"Calculated weighted average font size threshold: {weighted_font_threshold:.2f}")
-
-    short_blocks = filter_long_blocks(non_header_footer_blocks, weighted_font_threshold)
-    print(f"3. Long block filtering complete. {len(short_blocks)} blocks remaining.")
-
-    font_filtered_blocks = filter_small_fonts_by_weighted_mean(short_blocks, weighted_font_threshold)
-    print(f"4. Small font filtering complete. {len(font_filtered_blocks)} blocks remaining.")
-
-    final_blocks = post_process_blocks(font_filtered_blocks)
-    print(f"5. Post-processing and cleaning complete. {len(final_blocks)} blocks remaining.")
+    final_blocks = apply_all_filters(extracted_blocks, page_count)
+    print(f"2. Filtering and cleaning complete. {len(final_blocks)} blocks remaining.")
 
-    featured_blocks = engineer_layout_features(final_blocks)
-    print(f"6. Successfully engineered layout features.")
+    features = engineer_layout_features(final_blocks)
+    featured_blocks = final_blocks.to_records()
+    for i, block in enumerate(featured_blocks):
+        block.update({name: values[i].item() for name, values in features.items()})
+    print("3. Successfully engineered layout features.")
 
     end_time = time.monotonic()
     duration = end_time - start_time
@@ -271,10 +413,6 @@ if __name__ == "__main__":
             # --- Updated: Print color along with size ---
             print(f"Block {i+1} (Page {block['page_number']}): {block['text']} [Size: {block['font_size']}, Color: {block['color']}]")
             print("-" * 20)
-        # for i, block in enumerate(featured_blocks):
-        #     # --- Updated: Print the entire feature dictionary for each block ---
-        #     print(f"--- Block {i+1} ---")
-        #     pprint.pprint(block)
     else:
         print("No blocks remained after filtering.")
 
@@ -3,12 +3,13 @@ import os
 import json
 import torch
 import time
-import pandas as pd
 import numpy as np
 from pathlib import Path
+from types import SimpleNamespace
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 # --- Make sure this import works by having an __init__.py file in the src folder ---
-from ingest import extract_logical_text_blocks, engineer_layout_features
+from ingest import BlockTable, extract_logical_text_blocks, engineer_layout_features
 
 from transformers import AutoTokenizer, AutoModelForSequenceClassification
 from transformers.pipelines import pipeline
@@ -19,113 +20,237 @@ from transformers.pipelines import pipeline
 INPUT_DIR = Path("/app/input")
 OUTPUT_DIR = Path("/app/output")
 MODEL_DIR = Path("/app/model")
+ONNX_MODEL_DIR = MODEL_DIR / "onnx_int8" # Produced by quantize_model.py (opt-in build step)
+ONNX_MODEL_FILE = "model_int8.onnx"
+# int8 is opt-in: it disagrees with FP32 on a noticeable share of H1/H2/H3 labels
+USE_INT8_ONNX = os.environ.get("USE_INT8_ONNX") == "1"
+# Opt-in "blocks" shortcut for uniform body pages; approximates their blocks (see ingest.py)
+FAST_BODY_PAGES = os.environ.get("FAST_BODY_PAGES") == "1"
 
 # ==============================================================================
 # --- Semantic Tagging Logic (Integrated from create_training_data.py) ---
 # ==============================================================================
-def create_semantic_tags(df: pd.DataFrame) -> pd.DataFrame:
+FONT_SIZE_TAGS = np.array(['[FONT_LOW]', '[FONT_MEDIUM]', '[FONT_HIGH]'])
+TAG_ORDER = ('tag_bold', 'tag_font_size', 'tag_rel_font', 'tag_v_pos', 'tag_words')
+
+def create_semantic_tags(relative_font_size: np.ndarray, vertical_position: np.ndarray, word_count: np.ndarray,
+                         font_size: np.ndarray, is_bold: np.ndarray) -> dict[str, np.ndarray]:
     """
     Converts raw numerical features into discrete semantic tags.
     This logic MUST be identical to the logic used for training.
     """
-    if df.empty:
-        return df
-
     # --- Rule-Based Tagging for Normalized/Predictable Features ---
     # Rule for 'relative_font_size'
-    rfs_conditions = [df['relative_font_size'] > 1.15, df['relative_font_size'] < 0.95]
+    rfs_conditions = [relative_font_size > 1.15, relative_font_size < 0.95]
     rfs_choices = ['[RFS_HIGH]', '[RFS_LOW]']
-    df['tag_rel_font'] = np.select(rfs_conditions, rfs_choices, default='[RFS_MEDIUM]')
+    tag_rel_font = np.select(rfs_conditions, rfs_choices, default='[RFS_MEDIUM]')
 
     # Rule for 'vertical_position'
-    pos_conditions = [df['vertical_position'] < 0.25, df['vertical_position'] > 0.75]
+    pos_conditions = [vertical_position < 0.25, vertical_position > 0.75]
     pos_choices = ['[POS_TOP]', '[POS_BOTTOM]']
-    df['tag_v_pos'] = np.select(pos_conditions, pos_choices, default='[POS_MIDDLE]')
+    tag_v_pos = np.select(pos_conditions, pos_choices, default='[POS_MIDDLE]')
 
     # Rule for 'word_count'
-    wc_conditions = [df['word_count'] > 15, df['word_count'] < 5]
+    wc_conditions = [word_count > 15, word_count < 5]
     wc_choices = ['[WORDS_HIGH]', '[WORDS_LOW]']
-    df['tag_words'] = np.select(wc_conditions, wc_choices, default='[WORDS_MEDIUM]')
+    tag_words = np.select(wc_conditions, wc_choices, default='[WORDS_MEDIUM]')
 
     # --- Statistical Binning for features without a predictable scale (like absolute font_size) ---
-    try:
-        df['tag_font_size'] = pd.qcut(df['font_size'], q=3, labels=['[FONT_LOW]', '[FONT_MEDIUM]', '[FONT_HIGH]'], duplicates='drop')
-    except ValueError:
-        # Fallback for when all font sizes are the same (cannot create bins)
-        df['tag_font_size'] = '[FONT_MEDIUM]'
-
-    # Safely handle the boolean 'is_bold' feature
-    if 'is_bold' in df.columns:
-        df['tag_bold'] = df['is_bold'].apply(lambda x: '[STYLE_BOLD]' if x else '[STYLE_NOT_BOLD]')
+    # Tercile bins equivalent to pd.qcut(q=3): right-inclusive, lowest edge included.
+    edges = np.quantile(font_size, [0, 1/3, 2/3, 1]) if len(font_size) else np.zeros(4)
+    if len(np.unique(edges)) == len(edges):
+        tag_font_size = FONT_SIZE_TAGS[np.digitize(font_size, edges[1:-1], right=True)]
     else:
-        df['tag_bold'] = '[STYLE_NOT_BOLD]'
+        # Fallback for when font sizes cannot form three distinct bins
+        tag_font_size = np.full(len(font_size), '[FONT_MEDIUM]')
+
+    tag_bold = np.where(is_bold, '[STYLE_BOLD]', '[STYLE_NOT_BOLD]')
 
-    return df
+    return {
+        'tag_bold': tag_bold,
+        'tag_font_size': tag_font_size,
+        'tag_rel_font': tag_rel_font,
+        'tag_v_pos': tag_v_pos,
+        'tag_words': tag_words,
+    }
 
 # ==============================================================================
 # --- Feature String Creation (from training.py) ---
 # ==============================================================================
-def create_feature_string_from_tags(record: dict) -> str:
+def create_feature_strings(tags: dict[str, np.ndarray], texts: np.ndarray) -> list[str]:
     """
-    Converts a record with semantic tags into a single string for the model.
+    Combines each block's semantic tags and text into a single string for the model.
     This must match the format used during training.
     """
-    text = record.get('text', '')
-    tags = [
-        record.get('tag_bold'),
-        record.get('tag_font_size'),
-        record.get('tag_rel_font'),
-        record.get('tag_v_pos'),
-        record.get('tag_words'),
-    ]
-    feature_str = " ".join(tag for tag in tags if tag)
-    return f"{feature_str} {text}"
+    # Elementwise concatenation over object arrays, without per-row Python joins
+    feature_strings = tags[TAG_ORDER[0]].astype(object)
+    for name in TAG_ORDER[1:]:
+        feature_strings = feature_strings + ' ' + tags[name].astype(object)
+    return (feature_strings + ' ' + np.asarray(texts, dtype=object)).tolist()
+
+# ==============================================================================
+# --- Batched Inference ---
+# ==============================================================================
+LENGTH_BUCKETS = (32, 64, 128)  # Token-length ceilings; longer inputs share a final bucket
+INFERENCE_BATCH_SIZE = 64
+
+def make_length_batches(lengths: list[int]) -> list[list[int]]:
+    """
+    Groups input indices into batches of similar token length so that padding
+    only stretches each batch to its own longest member, not the global maximum.
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    batches, current, current_bucket = [], [], None
+    for idx in order:
+        bucket = next((b for b in LENGTH_BUCKETS if lengths[idx] <= b), None)
+        if current and (bucket != current_bucket or len(current) == INFERENCE_BATCH_SIZE):
+            batches.append(current)
+            current = []
+        current_bucket = bucket
+        current.append(idx)
+    if current:
+        batches.append(current)
+    return batches
+
+def classify_unique_texts(texts: list[str], tokenizer, model) -> list[str]:
+    """
+    Runs the model over feature strings in length-bucketed batches, returning
+    one label per input in the original order.
+    """
+    # One call through the fast (Rust) tokenizer; padding is deferred to each batch
+    encodings = tokenizer(texts, truncation=True, padding=False, return_tensors=None)
+    labels = [None] * len(texts)
+    with torch.no_grad():
+        for batch in make_length_batches([len(ids) for ids in encodings['input_ids']]):
+            features = tokenizer.pad(
+                {key: [encodings[key][i] for i in batch] for key in encodings.keys()},
+                pad_to_multiple_of=8, # Keeps tensor shapes oneDNN/MKL friendly
+                return_tensors='pt'
+            )
+            predicted_ids = model(**features).logits.argmax(-1).tolist()
+            for i, label_id in zip(batch, predicted_ids):
+                labels[i] = model.config.id2label[label_id]
+    return labels
+
+def predict_labels(texts: list[str], tokenizer, model) -> list[str]:
+    """
+    Returns one label per feature string, in input order. Repeated strings
+    (common headings like "Introduction" across PDFs) are tokenized and
+    classified only once.
+    """
+    if not texts:
+        return []
+
+    unique_texts = list(dict.fromkeys(texts))
+    labels = dict(zip(unique_texts, classify_unique_texts(unique_texts, tokenizer, model)))
+    return [labels[text] for text in texts]
+
+def load_classification_model(tokenizer):
+    """
+    Loads the FP32 PyTorch model, or the int8 ONNX Runtime model when
+    USE_INT8_ONNX=1 and it has been exported. Both expose the same
+    forward/logits interface.
+    """
+    if USE_INT8_ONNX and (ONNX_MODEL_DIR / ONNX_MODEL_FILE).is_file():
+        try:
+            from optimum.onnxruntime import ORTModelForSequenceClassification
+            model = ORTModelForSequenceClassification.from_pretrained(str(ONNX_MODEL_DIR), file_name=ONNX_MODEL_FILE)
+            print("Using int8 ONNX Runtime model.")
+            return model
+        except Exception as e:
+            print(f"  Warning: Could not load ONNX model ({e}). Using PyTorch model.")
+
+    model = AutoModelForSequenceClassification.from_pretrained(str(MODEL_DIR), torchscript=True, attn_implementation="eager")
+    model.eval() # Stays on CPU as per hackathon constraints
+    try:
+        return trace_torch_model(model, tokenizer)
+    except Exception as e:
+        print(f"  Warning: Could not trace PyTorch model ({e}). Running it eagerly.")
+        model.config.torchscript = False
+        return model
+
+class TracedSequenceClassifier:
+    """Gives a TorchScript-traced classifier the `.config` / `.logits` interface of the HF model."""
+    def __init__(self, traced_module, config):
+        self.traced_module = traced_module
+        self.config = config
+
+    def __call__(self, input_ids, attention_mask, **_):
+        # token_type_ids are all zeros for our single-segment inputs, the model's default
+        return SimpleNamespace(logits=self.traced_module(input_ids, attention_mask)[0])
+
+def trace_torch_model(model, tokenizer) -> TracedSequenceClassifier:
+    """
+    Traces the PyTorch model with TorchScript and applies the inference graph
+    optimizations (freezing, oneDNN/MKLDNN op fusion).
+    """
+    torch.backends.mkldnn.enabled = True
+    # A padded example so the attention-mask path is kept in the traced graph
+    dummy = tokenizer(["[STYLE_BOLD] x", "[STYLE_NOT_BOLD] [FONT_LOW] a b c"], padding=True, return_tensors='pt')
+    with torch.no_grad():
+        traced = torch.jit.trace(model, (dummy['input_ids'], dummy['attention_mask']), strict=False)
+    return TracedSequenceClassifier(torch.jit.optimize_for_inference(traced), model.config)
+
+def predict_labels_with_pipeline(texts: list[str]) -> list[str]:
+    """Fallback classification through the standard HF pipeline interface."""
+    if not texts:
+        return []
+    classifier = pipeline(
+        "text-classification",
+        model=str(MODEL_DIR),
+        tokenizer=str(MODEL_DIR),
+        device=-1 # Forcing CPU as per hackathon constraints
+    )
+    predictions = classifier(texts, top_k=1, truncation=True, padding=True)
+    return [prediction[0]['label'] if prediction else "P" for prediction in predictions]
 
 # ==============================================================================
 # --- Main Inference Pipeline ---
 # ==============================================================================
-def process_single_pdf(pdf_path: Path, classifier):
-    """Processes a single PDF, from feature extraction to prediction."""
+def prepare_single_pdf(pdf_path: Path):
+    """
+    Runs feature extraction and semantic tagging for a single PDF.
+    Returns the block table and its feature strings, or None on failure.
+    """
     print(f"  -> Processing: {pdf_path.name}")
     
     # 1. Extract raw blocks and engineer numerical features
     try:
-        raw_blocks, _ = extract_logical_text_blocks(str(pdf_path))
-        if not raw_blocks:
+        blocks, _ = extract_logical_text_blocks(str(pdf_path), fast_body_pages=FAST_BODY_PAGES)
+        if not blocks:
             print(f"  Warning: No text blocks extracted from {pdf_path.name}.")
             return None
-        featured_blocks = engineer_layout_features(raw_blocks)
+        features = engineer_layout_features(blocks)
     except Exception as e:
         print(f"  Error during PDF processing with 'ingest' functions: {e}")
         return None
 
     # 2. Convert numerical features to semantic tags
-    featured_df = pd.DataFrame(featured_blocks)
-    tagged_df = create_semantic_tags(featured_df)
-    tagged_blocks = tagged_df.to_dict('records')
+    tags = create_semantic_tags(
+        features['relative_font_size'], features['vertical_position'], features['word_count'],
+        blocks.font_size, blocks.is_bold
+    )
 
     # 3. Prepare tagged blocks for inference
-    inference_texts = [create_feature_string_from_tags(block) for block in tagged_blocks]
+    inference_texts = create_feature_strings(tags, blocks.text)
 
-    # 4. Run prediction
-    try:
-        predictions = classifier(inference_texts, top_k=1, truncation=True, padding=True)
-    except Exception as e:
-        print(f"  Error during model inference: {e}")
-        return None
+    return blocks, inference_texts
+
+def init_ingest_worker():
+    """Keeps ingest workers single-threaded so they don't oversubscribe the CPU."""
+    torch.set_num_threads(1)
 
-    # 5. Assemble final JSON output
+def build_outline(pdf_path: Path, blocks: BlockTable, labels: list[str]) -> dict:
+    """Assembles the final JSON output for a PDF from its per-block labels."""
     outline = []
     title_text = pdf_path.stem # Default title
 
-    for i, block in enumerate(tagged_blocks):
-        predicted_label = predictions[i][0]['label'] if predictions and i < len(predictions) and predictions[i] else "P"
-        
+    for text, page_number, predicted_label in zip(blocks.text, blocks.page_number.tolist(), labels):
         if predicted_label in ["Title", "H1", "H2", "H3"]:
             outline.append({
                 "level": predicted_label,
-                "text": block.get("text", ""),
-                "page": block.get("page_number", 0)
+                "text": text,
+                "page": page_number
             })
     
     # Logic to find the best title from the predictions
@@ -147,36 +272,65 @@ def process_single_pdf(pdf_path: Path, classifier):
 if __name__ == "__main__":
     print("--- Starting Document Outline Extraction Pipeline ---")
 
-    # 1. Load the fine-tuned model and tokenizer ONCE
-    print("Loading classification model...")
     if not MODEL_DIR.is_dir():
         print(f"FATAL: Model directory not found at {MODEL_DIR}. Exiting.")
         exit()
 
+    # 1. Extract and tag blocks for all PDF files in parallel worker processes.
+    # This runs before torch is configured or used here, so workers fork from a clean parent.
+    OUTPUT_DIR.mkdir(exist_ok=True)
+    pdf_files = list(INPUT_DIR.glob("*.pdf"))
+    print(f"Found {len(pdf_files)} PDF(s) to process in {INPUT_DIR}.")
+
+    start_time = time.time()
+    prepared = []
+    if pdf_files:
+        max_workers = min(os.cpu_count() or 1, len(pdf_files))
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=init_ingest_worker) as executor:
+            futures = {executor.submit(prepare_single_pdf, pdf_path): pdf_path for pdf_path in pdf_files}
+            for future in as_completed(futures):
+                pdf_path = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"  Error in ingest worker for {pdf_path.name}: {e}")
+                    result = None
+                if result is None:
+                    print(f"  -> Skipping {pdf_path.name} due to a processing error.")
+                    continue
+                prepared.append((pdf_path, *result))
+
+    # 2. Load the fine-tuned model and tokenizer ONCE, with all cores for intra-op work
+    torch.set_num_threads(os.cpu_count() or 1)
+    torch.set_num_interop_threads(1)
+    print("Loading classification model...")
     try:
-        classifier = pipeline(
-            "text-classification",
-            model=str(MODEL_DIR),
-            tokenizer=str(MODEL_DIR),
-            device=-1 # Forcing CPU as per hackathon constraints
-        )
+        tokenizer = AutoTokenizer.from_pretrained(str(MODEL_DIR), use_fast=True)
+        model = load_classification_model(tokenizer)
         print("Model loaded successfully.")
     except Exception as e:
         print(f"FATAL: Could not load model. Error: {e}")
         exit()
 
-    # 2. Process all PDF files found in the input directory
-    OUTPUT_DIR.mkdir(exist_ok=True)
-    pdf_files = list(INPUT_DIR.glob("*.pdf"))
-    print(f"Found {len(pdf_files)} PDF(s) to process in {INPUT_DIR}.")
+    # 3. Classify the blocks of every PDF in one length-bucketed pass
+    all_texts = [text for _, _, inference_texts in prepared for text in inference_texts]
+    print(f"Classifying {len(all_texts)} blocks across {len(prepared)} PDF(s)...")
+    try:
+        all_labels = predict_labels(all_texts, tokenizer, model)
+    except Exception as e:
+        print(f"  Warning: Batched inference failed ({e}). Falling back to the HF pipeline.")
+        try:
+            all_labels = predict_labels_with_pipeline(all_texts)
+        except Exception as e:
+            print(f"FATAL: Error during model inference: {e}")
+            exit()
 
-    for pdf_path in pdf_files:
-        start_time = time.time()
-        output_data = process_single_pdf(pdf_path, classifier)
-        
-        if output_data is None:
-            print(f"  -> Skipping {pdf_path.name} due to a processing error.")
-            continue
+    # 4. Scatter labels back to their PDFs and save the outlines
+    offset = 0
+    for pdf_path, blocks, inference_texts in prepared:
+        labels = all_labels[offset:offset + len(inference_texts)]
+        offset += len(inference_texts)
+        output_data = build_outline(pdf_path, blocks, labels)
             
         json_filename = f"{pdf_path.stem}.json"
         output_path = OUTPUT_DIR / json_filename
@@ -184,7 +338,7 @@ if __name__ == "__main__":
         with open(output_path, 'w', encoding='utf-8') as f:
             json.dump(output_data, f, indent=4)
         
-        duration = time.time() - start_time
-        print(f"  -> Finished {pdf_path.name} in {duration:.2f}s. Output saved to {output_path}.")
-            
-    print("--- All files processed. Pipeline finished. ---")
\ No newline at end of file
+        print(f"  -> Finished {pdf_path.name}. Output saved to {output_path}.")
+
+    duration = time.time() - start_time
+    print(f"--- All files processed in {duration:.2f}s. Pipeline finished. ---")
@@ -0,0 +1,41 @@
+# src/quantize_model.py
+import sys
+import shutil
+from pathlib import Path
+
+from onnxruntime.quantization import quantize_dynamic, QuantType
+from optimum.onnxruntime import ORTModelForSequenceClassification
+from transformers import AutoTokenizer
+
+# ==============================================================================
+# --- One-time export of the fine-tuned classifier to int8 ONNX ---
+# ==============================================================================
+# Usage: python src/quantize_model.py [model_dir] [output_dir]
+# Run at image build time; main.py picks up the result from MODEL_DIR/onnx_int8.
+ONNX_FILE_NAME = "model.onnx"
+QUANTIZED_FILE_NAME = "model_int8.onnx"
+
+def export_quantized_model(model_dir: Path, output_dir: Path) -> Path:
+    """
+    Exports the HF model to ONNX and applies dynamic int8 weight quantization.
+    The tokenizer and config are saved alongside so the directory is self-contained.
+    """
+    export_dir = output_dir / "fp32"
+    ort_model = ORTModelForSequenceClassification.from_pretrained(str(model_dir), export=True)
+    ort_model.save_pretrained(str(export_dir))
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    quantized_path = output_dir / QUANTIZED_FILE_NAME
+    quantize_dynamic(str(export_dir / ONNX_FILE_NAME), str(quantized_path), weight_type=QuantType.QInt8)
+
+    ort_model.config.save_pretrained(str(output_dir))
+    AutoTokenizer.from_pretrained(str(model_dir)).save_pretrained(str(output_dir))
+    shutil.rmtree(export_dir) # Only the quantized graph is shipped
+    return quantized_path
+
+
+if __name__ == "__main__":
+    model_dir = Path(sys.argv[1]) if len(sys.argv) > 1 else Path("/app/model")
+    output_dir = Path(sys.argv[2]) if len(sys.argv) > 2 else model_dir / "onnx_int8"
+    quantized_path = export_quantized_model(model_dir, output_dir)
+    print(f"Saved int8 ONNX model to {quantized_path}.")